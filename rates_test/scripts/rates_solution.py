@@ -1,8 +1,69 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import time
 
+
+def _lookup_spot_rates(price_ts, price_codes, spot_ts, spot_rate, offsets, tolerance_ns,
+                       max_workers=1):
+    """
+    Find the latest spot rate within tolerance for each price.
+    
+    Spot data is laid out CSR-style: ``spot_ts`` and ``spot_rate`` are sorted
+    by (ccy code, timestamp) and the spots for code ``c`` live in
+    ``offsets[c]:offsets[c + 1]``. Each code segment is searched with a single
+    vectorized ``np.searchsorted`` call. Segments are independent and write to
+    disjoint rows of the output, so they can be searched on a thread pool;
+    NumPy releases the GIL inside ``searchsorted``.
+    
+    Args:
+        price_ts (ndarray): Price timestamps as int64 nanoseconds
+        price_codes (ndarray): Categorical ccy_pair code of each price, rows
+            with code -1 are skipped
+        spot_ts (ndarray): Sorted spot timestamps as int64 nanoseconds
+        spot_rate (ndarray): Spot mid rates aligned with ``spot_ts``
+        offsets (ndarray): Start of each code's segment, length n_codes + 1
+        tolerance_ns (int): Maximum age of a usable spot rate in nanoseconds
+        max_workers (int, optional): Threads used to search segments. Defaults to 1.
+        
+    Returns:
+        ndarray: Matched spot rate per price, NaN where none is within tolerance
+    """
+    out = np.full(len(price_ts), np.nan)
+    
+    # Group price rows by code so each segment is visited once
+    order = np.argsort(price_codes, kind='stable')
+    row_bounds = np.searchsorted(price_codes[order], np.arange(len(offsets)))
+    
+    def lookup(code):
+        rows = order[row_bounds[code]:row_bounds[code + 1]]
+        seg_ts = spot_ts[offsets[code]:offsets[code + 1]]
+        seg_rate = spot_rate[offsets[code]:offsets[code + 1]]
+        ts = price_ts[rows]
+        
+        # Position of the latest spot at or before each price timestamp
+        pos = np.searchsorted(seg_ts, ts, side='right') - 1
+        found = pos >= 0
+        found[found] = ts[found] - seg_ts[pos[found]] <= tolerance_ns
+        out[rows[found]] = seg_rate[pos[found]]
+    
+    # Only codes with both prices and spots need a search
+    codes = np.flatnonzero((np.diff(row_bounds) > 0) & (np.diff(offsets) > 0))
+    
+    if max_workers > 1 and len(codes) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(lookup, codes))
+    else:
+        for code in codes:
+            lookup(code)
+    
+    return out
+
+
 class RatesPriceConverter:
     """
     Convert currency prices based on spot rates and conversion factors.
@@ -12,13 +73,30 @@ class RatesPriceConverter:
     2. Identifying prices that need conversion
     3. Finding appropriate spot rates within the specified time window
     4. Applying the conversion formula: new_price = (price / conversion_factor) + spot_mid_rate
-    5. Tracking reasons for any conversion failures
+    5. Tracking reasons for any conversion failures, including currency pairs
+       that are missing from the reference data
     
     The implementation is optimized for performance using vectorized operations
     where possible and efficient pandas merge operations.
     """
     
-    def __init__(self, ccy_path, price_path, spot_path):
+    NO_CONVERSION_REASON = 'no conversion required'
+    CONVERTED_REASON = 'converted'
+    NO_SPOT_REASON = 'no spot_mid_rate in previous hour'
+    UNSUPPORTED_REASON = 'ccy_pair not supported or missing conversion info'
+    
+    # Reasons are stored as a categorical, the codes follow this order
+    REASON_DTYPE = pd.CategoricalDtype([
+        NO_CONVERSION_REASON,
+        CONVERTED_REASON,
+        NO_SPOT_REASON,
+        UNSUPPORTED_REASON
+    ])
+    NO_CONVERSION_CODE, CONVERTED_CODE, NO_SPOT_CODE, UNSUPPORTED_CODE = range(4)
+    
+    SPOT_TOLERANCE = pd.Timedelta('1h')
+    
+    def __init__(self, ccy_path, price_path, spot_path, max_workers=1):
         """
         Initialize the converter with paths to required data files.
         
@@ -26,118 +104,181 @@ class RatesPriceConverter:
             ccy_path (str or Path): Path to CSV file with currency pair information
             price_path (str or Path): Path to parquet file with price data
             spot_path (str or Path): Path to parquet file with spot rate data
+            max_workers (int, optional): Threads used for the per-pair spot
+                lookups. Defaults to 1 (no thread pool).
         """
         self.ccy_path = Path(ccy_path)
         self.price_path = Path(price_path)
         self.spot_path = Path(spot_path)
+        self.max_workers = max_workers
         self.ccy_df = None
         self.price_df = None
         self.spot_df = None
+        self._spot_ts = None
+        self._spot_rate = None
+        self._spot_offsets = None
 
     def load_data(self):
         """
         Load and prepare all required data from source files.
         
-        Loads currency pair information, price data, and spot rates, 
-        and converts timestamps to datetime objects for consistent processing.
+        Loads currency pair information, price data, and spot rates. Only the
+        needed parquet columns are read and timestamps are cast to datetime
+        by Arrow while reading. The ``ccy_pair`` columns are converted to a
+        categorical shared by all three tables so joins compare integer codes
+        rather than strings.
         """
         self.ccy_df = pd.read_csv(self.ccy_path)
-        self.price_df = pd.read_parquet(self.price_path)
-        self.spot_df = pd.read_parquet(self.spot_path)
+        self.price_df = self._read_parquet(self.price_path, ['ccy_pair', 'timestamp', 'price'])
+        self.spot_df = self._read_parquet(self.spot_path, ['ccy_pair', 'timestamp', 'spot_mid_rate'])
         
-        # Convert timestamps once at load time
+        # Use the same categories everywhere so the codes line up in merges;
+        # a null ccy_pair is not a category and keeps code -1
+        pairs = pd.Index(self.ccy_df['ccy_pair'].dropna().unique())
         for df in [self.price_df, self.spot_df]:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            pairs = pairs.union(df['ccy_pair'].dropna().unique())
+        ccy_dtype = pd.CategoricalDtype(pairs)
+        for df in [self.ccy_df, self.price_df, self.spot_df]:
+            df['ccy_pair'] = df['ccy_pair'].astype(ccy_dtype)
+        
+        # Sort spot rates once here so no process() call has to
+        self.spot_df = self.spot_df.sort_values(
+            ['ccy_pair', 'timestamp'], kind='stable', na_position='first'
+        ).reset_index(drop=True)
+        self._index_spot_rates()
+
+    @staticmethod
+    def _read_parquet(path, columns):
+        """
+        Read selected parquet columns with the timestamp cast in Arrow.
+        
+        The source files may store timestamps as strings; casting the Arrow
+        column avoids a separate ``pd.to_datetime`` pass after loading. The
+        file's pandas metadata is ignored when converting, since it would
+        turn a cast string column back into strings.
+        
+        Args:
+            path (Path): Parquet file to read
+            columns (list): Columns to load, must include 'timestamp'
+            
+        Returns:
+            DataFrame: Loaded data with a datetime64[ns] timestamp column
+        """
+        table = pq.read_table(path, columns=columns)
+        idx = table.schema.get_field_index('timestamp')
+        table = table.set_column(
+            idx, 'timestamp', table['timestamp'].cast(pa.timestamp('ns'))
+        )
+        return table.to_pandas(ignore_metadata=True)
+
+    def _index_spot_rates(self):
+        """
+        Cache the spot rates as flat arrays sorted by currency pair and time.
+        
+        Expects ``spot_df`` to be sorted by (ccy_pair, timestamp) already.
+        Stores the spot timestamps (as int64 nanoseconds) and mid rates, plus
+        the offset at which each pair's segment starts, so lookups never
+        construct DataFrames.
+        """
+        codes = self.spot_df['ccy_pair'].cat.codes.to_numpy()
+        
+        self._spot_ts = self.spot_df['timestamp'].to_numpy(dtype='datetime64[ns]').view('i8')
+        self._spot_rate = self.spot_df['spot_mid_rate'].to_numpy()
+        n_codes = len(self.spot_df['ccy_pair'].cat.categories)
+        self._spot_offsets = np.searchsorted(codes, np.arange(n_codes + 1))
 
     def _prepare_merged_data(self):
         """
         Prepare the initial merged DataFrame with price and currency info.
         
-        Merges price data with currency pair information and creates a unique
-        identifier for each row to handle duplicates correctly.
+        Merges price data with currency pair information. The default integer
+        index identifies each row, so duplicate (ccy_pair, timestamp) prices
+        are handled without building a separate key.
         
         Returns:
-            DataFrame: Merged data with initial conversion settings
+            DataFrame: Merged data with conversion settings for each price
         """
-        merged = self.price_df.merge(
+        return self.price_df.merge(
             self.ccy_df, 
             on='ccy_pair', 
             how='left', 
             indicator=True
         )
-        
-        # Add row_id for handling duplicates
-        merged['row_id'] = (
-            merged['ccy_pair'].astype(str) + '|' + 
-            merged['timestamp'].astype(str) + '_' + 
-            (merged.groupby(['ccy_pair', 'timestamp']).cumcount() + 1).astype(str)
-        )
-        
-        # Initialize result columns
-        merged['new_price'] = merged['price']
-        merged['reason'] = 'no conversion required'
-        
-        return merged
 
-    def _get_spot_rates(self, conversion_needed):
+    def _get_spot_rates(self, merged, needs):
         """
         Get appropriate spot rates for prices requiring conversion.
         
         For each price requiring conversion, finds the most recent spot rate
-        within the preceding hour.
+        within the preceding hour using a binary search over the cached
+        spot arrays. Rows outside ``needs`` are not searched.
         
         Args:
-            conversion_needed (DataFrame): Subset of data needing conversion
+            merged (DataFrame): All prices merged with currency pair info
+            needs (ndarray): Boolean mask of rows requiring conversion
             
         Returns:
-            DataFrame: Prices with matched spot rates where available
-        """
-        # Sort timestamps once
-        sorted_conversions = conversion_needed.sort_values('timestamp')
-        sorted_spots = self.spot_df.sort_values('timestamp')
-        
-        # Use merge_asof for efficient lookback
-        return pd.merge_asof(
-            sorted_conversions,
-            sorted_spots,
-            by='ccy_pair',
-            left_on='timestamp',
-            right_on='timestamp',
-            direction='backward'
+            ndarray: Spot rate for each row of ``merged``, NaN where no spot
+            was found within the previous hour or none was needed
+        """
+        # A code of -1 excludes a row from the lookup
+        codes = np.where(needs, merged['ccy_pair'].cat.codes.to_numpy(), -1)
+        # Timestamps as int64 nanoseconds, a view of merged's column
+        price_ts = merged['timestamp'].to_numpy(dtype='datetime64[ns]').view('i8')
+        return _lookup_spot_rates(
+            price_ts,
+            codes,
+            self._spot_ts,
+            self._spot_rate,
+            self._spot_offsets,
+            self.SPOT_TOLERANCE.value,
+            max_workers=self.max_workers
         )
 
-    def _apply_conversions(self, conversion_window):
+    def _apply_conversions(self, merged, spot, needs, invalid):
         """
-        Apply conversion calculations to valid rows.
+        Apply conversion calculations and set the reason for every row.
         
         For rows with a valid spot rate in the previous hour, calculates the
-        new price using the conversion formula and updates the reason for conversion.
+        new price using the conversion formula. Rows that need conversion but
+        have no spot rate, and unsupported rows, get no new price; all other
+        rows keep their original price.
         
         Args:
-            conversion_window (DataFrame): Data requiring conversion with matched spot rates
+            merged (DataFrame): All prices merged with currency pair info
+            spot (ndarray): Matched spot rate per row, NaN where missing
+            needs (ndarray): Boolean mask of rows requiring conversion
+            invalid (ndarray): Boolean mask of unsupported rows
             
         Returns:
-            DataFrame: Conversion results with updated new_price and reason columns
+            DataFrame: The same frame with new_price and reason columns added
         """
-        # Calculate time difference for validity check
-        is_valid = (
-            conversion_window['timestamp'] - 
-            conversion_window['timestamp'].dt.floor('h')
-        ).dt.total_seconds() <= 3600
-
-        # Apply conversions where valid
-        result = conversion_window.copy()
-        result.loc[is_valid, 'new_price'] = (
-            result.loc[is_valid, 'price'] / 
-            result.loc[is_valid, 'conversion_factor']
-        ) + result.loc[is_valid, 'spot_mid_rate']
+        # Pull the underlying float arrays once and work on those
+        price = merged['price'].to_numpy(copy=False)
+        factor = merged['conversion_factor'].to_numpy(copy=False)
+        
+        converted = needs & ~np.isnan(spot)
         
-        # Set reasons
-        result.loc[is_valid, 'reason'] = 'converted'
-        result.loc[~is_valid, 'reason'] = 'no spot_mid_rate in previous hour'
-        result.loc[~is_valid, 'new_price'] = np.nan
+        # Compute in a single buffer, a missing spot rate propagates as NaN
+        new_price = np.empty_like(price)
+        np.divide(price, factor, out=new_price)
+        np.add(new_price, spot, out=new_price)
         
-        return result
+        # Rows that need no conversion keep their price
+        keep_price = ~needs & ~invalid
+        new_price[keep_price] = price[keep_price]
+        
+        reason_code = np.select(
+            [invalid, converted, needs],
+            [self.UNSUPPORTED_CODE, self.CONVERTED_CODE, self.NO_SPOT_CODE],
+            default=self.NO_CONVERSION_CODE
+        ).astype(np.int8)
+        
+        # Write both result columns into the frame directly
+        merged['new_price'] = new_price
+        merged['reason'] = pd.Categorical.from_codes(reason_code, dtype=self.REASON_DTYPE)
+        
+        return merged
 
     def process(self):
         """
@@ -145,7 +286,7 @@ class RatesPriceConverter:
         
         This is the main method that:
         1. Prepares the merged dataset
-        2. Identifies prices requiring conversion
+        2. Identifies prices requiring conversion and flags unsupported pairs
         3. Finds appropriate spot rates
         4. Applies conversions where possible
         5. Returns a consolidated result
@@ -156,19 +297,18 @@ class RatesPriceConverter:
         # Prepare initial data
         merged = self._prepare_merged_data()
         
-        # Find rows that need conversion
-        conversion_needed = merged[merged['convert_price'] == True].copy()
+        # Flag rows whose ccy_pair is unknown or lacks conversion info
+        convert_flag = merged['convert_price'].fillna(False).astype(bool)
+        invalid = (
+            merged['_merge'].eq('left_only') |
+            merged['convert_price'].isna() |
+            (convert_flag & merged['conversion_factor'].isna())
+        ).to_numpy()
+        needs = convert_flag.to_numpy() & ~invalid
         
-        if not conversion_needed.empty:
-            # Get and apply conversions
-            conversion_window = self._get_spot_rates(conversion_needed)
-            result_window = self._apply_conversions(conversion_window)
-            
-            # Update original DataFrame efficiently
-            merged.set_index('row_id', inplace=True)
-            result_window.set_index('row_id', inplace=True)
-            merged.loc[result_window.index, ['new_price', 'reason']] = result_window[['new_price', 'reason']]
-            merged.reset_index(drop=True, inplace=True)
+        # Look up and convert over the whole frame, no subset to join back
+        spot = self._get_spot_rates(merged, needs)
+        merged = self._apply_conversions(merged, spot, needs, invalid)
         
         # Return only needed columns
         return merged[['ccy_pair', 'timestamp', 'price', 'new_price', 'reason']]
@@ -177,11 +317,27 @@ class RatesPriceConverter:
         """
         Save results to CSV.
         
+        Uses Arrow's multi-threaded C++ CSV writer rather than pandas'
+        Python-level row formatting.
+        
         Args:
             df (DataFrame): Results DataFrame to save
             output_path (str or Path): Path where the CSV should be saved
         """
-        df.to_csv(output_path, index=False)
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), str(output_path))
+
+    def save_parquet(self, df, output_path):
+        """
+        Save results to a snappy-compressed parquet file.
+        
+        Much faster to write and smaller than CSV, for consumers that can
+        read parquet.
+        
+        Args:
+            df (DataFrame): Results DataFrame to save
+            output_path (str or Path): Path where the parquet file should be saved
+        """
+        df.to_parquet(output_path, engine='pyarrow', compression='snappy', index=False)
 
 
 def main():
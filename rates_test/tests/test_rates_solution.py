@@ -1,3 +1,5 @@
+import contextlib
+import gc
 import unittest
 import pandas as pd
 import numpy as np
@@ -12,6 +14,22 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 # Import the solution
 from scripts.rates_solution import RatesPriceConverter
 
+
+@contextlib.contextmanager
+def gc_disabled():
+    """
+    Pause the cyclic garbage collector while the fixtures are built.
+    
+    A copy of the helper in stdev_test/tests/_fixtures.py; the two test
+    suites run from separate roots and share no modules.
+    """
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
 class TestRatesPriceConverter(unittest.TestCase):
     
     def setUp(self):
@@ -20,46 +38,49 @@ class TestRatesPriceConverter(unittest.TestCase):
         self.test_dir = tempfile.TemporaryDirectory()
         self.temp_dir = Path(self.test_dir.name)
         
-        # Create test currency data
-        ccy_data = pd.DataFrame({
-            'ccy_pair': ['EUR/USD', 'GBP/USD', 'JPY/USD', 'AUD/USD'],
-            'convert_price': [True, True, False, True],
-            'conversion_factor': [1.2, 1.5, 110.0, 0.75]
-        })
-        
-        # Create test price data
-        dates = pd.date_range('2021-01-01', periods=10, freq='h')
-        price_data = []
-        for ccy in ccy_data['ccy_pair']:
-            for date in dates:
-                price_data.append({
-                    'ccy_pair': ccy,
-                    'timestamp': date,
-                    'price': np.random.uniform(0.5, 2.0)
-                })
-        price_df = pd.DataFrame(price_data)
-        
-        # Create spot rate data (with some rates missing to test edge cases)
-        spot_data = []
-        for ccy in ccy_data['ccy_pair']:
-            if ccy != 'JPY/USD':  # Skip one to test missing spot rates
-                for date in dates[:-1]:  # Make one missing at the end
-                    spot_data.append({
+        # Building and writing the fixtures only makes short-lived objects,
+        # so keep the cyclic collector out of the way until they are saved
+        with gc_disabled():
+            # Create test currency data
+            ccy_data = pd.DataFrame({
+                'ccy_pair': ['EUR/USD', 'GBP/USD', 'JPY/USD', 'AUD/USD'],
+                'convert_price': [True, True, False, True],
+                'conversion_factor': [1.2, 1.5, 110.0, 0.75]
+            })
+            
+            # Create test price data
+            dates = pd.date_range('2021-01-01', periods=10, freq='h')
+            price_data = []
+            for ccy in ccy_data['ccy_pair']:
+                for date in dates:
+                    price_data.append({
                         'ccy_pair': ccy,
-                        'timestamp': date - pd.Timedelta(minutes=30),  # 30 min before price
-                        'spot_mid_rate': np.random.uniform(0.8, 1.2)
+                        'timestamp': date,
+                        'price': np.random.uniform(0.5, 2.0)
                     })
-        spot_df = pd.DataFrame(spot_data)
-        
-        # Save test data
-        self.ccy_path = self.temp_dir / 'test_ccy_data.csv'
-        self.price_path = self.temp_dir / 'test_price_data.parq.gzip'
-        self.spot_path = self.temp_dir / 'test_spot_rate_data.parq.gzip'
-        self.output_path = self.temp_dir / 'test_output.csv'
-        
-        ccy_data.to_csv(self.ccy_path, index=False)
-        price_df.to_parquet(self.price_path, compression='gzip')
-        spot_df.to_parquet(self.spot_path, compression='gzip')
+            price_df = pd.DataFrame(price_data)
+            
+            # Create spot rate data (with some rates missing to test edge cases)
+            spot_data = []
+            for ccy in ccy_data['ccy_pair']:
+                if ccy != 'JPY/USD':  # Skip one to test missing spot rates
+                    for date in dates[:-1]:  # Make one missing at the end
+                        spot_data.append({
+                            'ccy_pair': ccy,
+                            'timestamp': date - pd.Timedelta(minutes=30),  # 30 min before price
+                            'spot_mid_rate': np.random.uniform(0.8, 1.2)
+                        })
+            spot_df = pd.DataFrame(spot_data)
+            
+            # Save test data
+            self.ccy_path = self.temp_dir / 'test_ccy_data.csv'
+            self.price_path = self.temp_dir / 'test_price_data.parquet'
+            self.spot_path = self.temp_dir / 'test_spot_rate_data.parquet'
+            self.output_path = self.temp_dir / 'test_output.csv'
+            
+            ccy_data.to_csv(self.ccy_path, index=False)
+            price_df.to_parquet(self.price_path, compression=None)
+            spot_df.to_parquet(self.spot_path, compression=None)
 
     def tearDown(self):
         """Clean up test data"""
@@ -101,7 +122,128 @@ class TestRatesPriceConverter(unittest.TestCase):
         
         # Verify at least some conversions happened
         self.assertGreater(len(converted), 0, "Some EUR/USD prices should be converted")
-        
+
+        # The last price has no spot rate within the previous hour
+        last_eur = results_df[results_df['ccy_pair'] == 'EUR/USD'].iloc[-1]
+        self.assertEqual(last_eur['reason'], 'no spot_mid_rate in previous hour')
+        self.assertTrue(np.isnan(last_eur['new_price']))
+
+    def test_unsupported_pair(self):
+        """Test that prices for unknown currency pairs are flagged"""
+        # Add prices for a pair missing from the currency data, and one
+        # price and spot rate with no pair at all
+        price_df = pd.read_parquet(self.price_path)
+        extra = pd.DataFrame({
+            'ccy_pair': ['CAD/USD', 'CAD/USD', 'CAD/USD', None],
+            'timestamp': pd.date_range('2021-01-01', periods=4, freq='h'),
+            'price': [1.0, 1.1, 1.2, 1.3]
+        })
+        pd.concat([price_df, extra]).to_parquet(self.price_path, compression=None)
+        spot_df = pd.read_parquet(self.spot_path)
+        extra_spot = pd.DataFrame({
+            'ccy_pair': [None],
+            'timestamp': [pd.Timestamp('2021-01-01')],
+            'spot_mid_rate': [1.0]
+        })
+        pd.concat([spot_df, extra_spot]).to_parquet(self.spot_path, compression=None)
+
+        converter = RatesPriceConverter(
+            str(self.ccy_path),
+            str(self.price_path),
+            str(self.spot_path)
+        )
+        converter.load_data()
+        result = converter.process()
+
+        unsupported = result[result['ccy_pair'] == 'CAD/USD']
+        self.assertEqual(len(unsupported), 3)
+        self.assertTrue(all(unsupported['reason'] == RatesPriceConverter.UNSUPPORTED_REASON),
+                       "Unknown pairs should be flagged as unsupported")
+        self.assertTrue(unsupported['new_price'].isna().all(),
+                       "Unknown pairs should not get a new price")
+
+        no_pair = result[result['ccy_pair'].isna()]
+        self.assertEqual(len(no_pair), 1)
+        self.assertEqual(no_pair['reason'].iloc[0], RatesPriceConverter.UNSUPPORTED_REASON,
+                         "Prices without a pair should be flagged as unsupported")
+
+    def test_string_timestamps(self):
+        """Test that timestamps stored as strings are read as datetimes"""
+        converter = RatesPriceConverter(
+            str(self.ccy_path),
+            str(self.price_path),
+            str(self.spot_path)
+        )
+        converter.load_data()
+        expected = converter.process()
+
+        # Rewrite both parquet files with the timestamps as text
+        for path in (self.price_path, self.spot_path):
+            df = pd.read_parquet(path)
+            df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            df.to_parquet(path, compression=None)
+
+        converter = RatesPriceConverter(
+            str(self.ccy_path),
+            str(self.price_path),
+            str(self.spot_path)
+        )
+        converter.load_data()
+        self.assertEqual(converter.price_df['timestamp'].dtype, 'datetime64[ns]')
+        pd.testing.assert_frame_equal(converter.process(), expected)
+
+    def test_duplicate_ccy_row(self):
+        """Test that a repeated currency pair row repeats its prices"""
+        ccy_df = pd.read_csv(self.ccy_path)
+        pd.concat([ccy_df, ccy_df.iloc[:1]]).to_csv(self.ccy_path, index=False)
+
+        converter = RatesPriceConverter(
+            str(self.ccy_path),
+            str(self.price_path),
+            str(self.spot_path)
+        )
+        converter.load_data()
+        result = converter.process()
+
+        eur = result[result['ccy_pair'] == 'EUR/USD']
+        self.assertEqual(len(result), 50)
+        self.assertEqual(len(eur), 20)
+        self.assertGreater((eur['reason'] == 'converted').sum(), 0,
+                           "Repeated EUR/USD prices should still be converted")
+
+    def test_save_parquet(self):
+        """Test that parquet output round-trips the results"""
+        converter = RatesPriceConverter(
+            str(self.ccy_path),
+            str(self.price_path),
+            str(self.spot_path)
+        )
+        converter.load_data()
+        result = converter.process()
+
+        parquet_path = self.temp_dir / 'test_output.parquet'
+        converter.save_parquet(result, str(parquet_path))
+        loaded = pd.read_parquet(parquet_path)
+
+        self.assertEqual(list(loaded.columns), list(result.columns))
+        np.testing.assert_array_equal(loaded['new_price'].to_numpy(),
+                                      result['new_price'].to_numpy())
+
+    def test_threaded_lookup(self):
+        """Test that threaded spot lookups match the serial result"""
+        results = []
+        for workers in (1, 4):
+            converter = RatesPriceConverter(
+                str(self.ccy_path),
+                str(self.price_path),
+                str(self.spot_path),
+                max_workers=workers
+            )
+            converter.load_data()
+            results.append(converter.process())
+
+        pd.testing.assert_frame_equal(results[0], results[1])
+
 
 if __name__ == '__main__':
     unittest.main()
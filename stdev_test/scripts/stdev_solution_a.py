@@ -1,8 +1,63 @@
 import pandas as pd
 import numpy as np
-import json
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.feather as feather
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from collections import deque
+
+
+def _rolling_std_3col(values, window, prev_window, prev_stdev):
+    """
+    Rolling sample standard deviation over the columns of one security.
+    
+    Vectorized equivalent of feeding ``values`` row by row into a window: a
+    NaN clears a column's window, each full window yields a new stdev, and
+    rows without a full window repeat the last stdev seen for that column.
+    
+    Each window's stdev is computed two-pass, from its mean and then the
+    squared deviations from it, so no precision is lost to cancellation
+    between large running sums.
+    
+    Args:
+        values (ndarray): (n, 3) array of bid, mid and ask prices in time order
+        window (int): Number of values in each window
+        prev_window (ndarray): (window, 3) array of the values already in each
+            column's window at the start, oldest first and NaN-padded in front
+        prev_stdev (ndarray): Per column, the last stdev before the start, NaN
+            if there is none
+            
+    Returns:
+        tuple: (n, 3) array of stdevs and the (window, 3) window left after the
+        last row, in the same layout as ``prev_window``
+    """
+    n, n_cols = values.shape
+    
+    # The previous window continues into the new rows, while a leading NaN
+    # row stands in for whatever came before it
+    x = np.concatenate([np.full((1, n_cols), np.nan), prev_window, values])
+    m = len(x)
+    
+    # A window holding a NaN spans a reset, and its stdev comes out NaN
+    stdev = np.full((m, n_cols), np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(x, window, axis=0)
+    stdev[window - 1:] = windows.std(axis=-1, ddof=1)
+    
+    # Carry the last stdev forward, starting from the previous one
+    stdev[0] = prev_stdev
+    idx = np.arange(m)[:, None]
+    has_stdev = ~np.isnan(stdev)
+    last_row = np.maximum.accumulate(np.where(has_stdev, idx, 0), axis=0)
+    stdev = np.take_along_axis(stdev, last_row, axis=0)
+    
+    # Values up to a column's last reset are no longer part of its window
+    tail = x[m - window:].copy()
+    tail_idx = np.arange(window)[:, None]
+    last_reset = np.maximum.accumulate(np.where(np.isnan(tail), tail_idx, -1), axis=0)[-1]
+    tail[tail_idx <= last_reset] = np.nan
+    return stdev[window + 1:], tail
+
 
 class IncrementalStdevCalculator:
     """
@@ -11,8 +66,8 @@ class IncrementalStdevCalculator:
     This class implements an incremental approach to calculating standard deviations
     for time series data. It efficiently maintains calculation state by:
     
-    1. Using deques for O(1) window updates
-    2. Tracking running sums and squared sums for efficient variance calculation
+    1. Keeping each security's open bid/mid/ask windows in one array between runs
+    2. Processing each security's rows in one vectorized pass over its windows
     3. Detecting time gaps and resetting the calculation state when needed
     4. Persisting calculation state to disk for future use
     
@@ -20,167 +75,256 @@ class IncrementalStdevCalculator:
     where new data points arrive regularly and previous calculation state can be reused.
     """
     
-    def __init__(self, price_path, window_size=20, state_path=None):
+    PRICE_TYPES = ('bid', 'mid', 'ask')
+    # How far before start the calculation picks up earlier snaps
+    LOOKBACK = pd.Timedelta(days=7)
+    # The only parquet columns the calculation reads
+    COLUMNS = ['snap_time', 'security_id', 'bid', 'mid', 'ask']
+    
+    def __init__(self, price_path, window_size=20, state_path=None, max_workers=1,
+                 cache_path=None):
         """
         Initialize the calculator with data path and calculation parameters.
         
         Args:
-            price_path (str or Path): Path to the parquet file with price data
+            price_path (str, Path or file-like): Path to the parquet (or .feather)
+                file with price data, or an open binary buffer holding parquet
             window_size (int, optional): Size of the rolling window. Defaults to 20.
             state_path (str or Path, optional): Path to store/load calculation state.
+            max_workers (int, optional): Threads used to process securities. Defaults to 1.
+            cache_path (str or Path, optional): Path of a Feather file caching the
+                preprocessed price frame between runs.
         """
-        self.price_path = Path(price_path)
+        # Buffers are read as they are; anything else is a filesystem path
+        self.price_path = price_path if hasattr(price_path, 'read') else Path(price_path)
         self.window_size = window_size
         self.state_path = Path(state_path) if state_path else None
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.max_workers = max_workers
         self.df = None
         self.calculation_state = {}
+        # Set once process() changes the state, so unchanged state is not rewritten
+        self._dirty = False
+        # Flat copies of the sorted columns; security c's rows are
+        # _offsets[c]:_offsets[c + 1]
+        self._ts = None
+        self._values = None
+        self._offsets = None
 
     def _initialize_state(self):
         """Initialize or reset the calculation state dictionary."""
         self.calculation_state.clear()
+        self._dirty = False
 
-    def _get_state_key(self, security_id, price_type):
+    def _read_prices(self, dataframe=None):
         """
-        Generate a unique key for storing state data.
+        Read the used columns of the price file, with security_id as a categorical.
+        
+        Files with a ``.feather`` suffix are read as Arrow IPC, anything else
+        (including a buffer) as parquet.
         
         Args:
-            security_id (str): The security identifier
-            price_type (str): The price type ('bid', 'mid', or 'ask')
-            
+            dataframe (DataFrame, optional): Prices to use instead of reading the file
+        
         Returns:
-            str: A unique key combining security_id and price_type
+            DataFrame: snap_time, security_id, bid, mid and ask columns
         """
-        return f"{security_id}_{price_type}"
+        if dataframe is not None:
+            df = dataframe[self.COLUMNS].reset_index(drop=True)
+            df['security_id'] = df['security_id'].astype('category')
+            return df
+        if isinstance(self.price_path, Path) and self.price_path.suffix == '.feather':
+            df = feather.read_feather(self.price_path, columns=self.COLUMNS)
+            df['security_id'] = df['security_id'].astype('category')
+            return df
+        return pd.read_parquet(self.price_path, columns=self.COLUMNS,
+                               read_dictionary=['security_id'])
 
-    def load_data(self):
+    def load_data(self, dataframe=None):
         """
-        Load data from parquet file and restore any saved calculation state.
+        Load the price file and restore any saved calculation state.
         
         Reads the price data, ensures proper timestamp format, and attempts to
-        load previously saved calculation state if available.
-        """
-        # Load and sort
-        self.df = pd.read_parquet(self.price_path)
-        self.df.rename(columns={'snap_time': 'timestamp'}, inplace=True)
-        self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
-        self.df.sort_values(['security_id', 'timestamp'], inplace=True)
+        load previously saved calculation state if available. A fresh cached
+        frame, if one is configured, replaces the read and preprocessing.
         
-        # Ensure hourly snapshots for every hour
-        self._ensure_hourly_snapshots()
+        Args:
+            dataframe (DataFrame, optional): Prices with the price file's columns,
+                used instead of reading the file; the cache is then bypassed
+        """
+        if dataframe is None and self._cache_is_fresh():
+            self.df = feather.read_feather(self.cache_path)
+        else:
+            # Load and sort
+            self.df = self._read_prices(dataframe)
+            self.df.rename(columns={'snap_time': 'timestamp'}, inplace=True)
+            self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
+            # Rows without a security belong to no security's windows
+            self.df = self.df[self.df['security_id'].notna()]
+            # _read_prices returns security_id as a categorical, so sorting and
+            # grouping work on integer codes; sorted categories keep code order
+            # the same as label order
+            sec = self.df['security_id']
+            self.df['security_id'] = sec.cat.reorder_categories(sec.cat.categories.sort_values())
+            self.df.sort_values(['security_id', 'timestamp'], inplace=True)
+            
+            # Ensure hourly snapshots for every hour
+            self._ensure_hourly_snapshots()
+            
+            if self.cache_path and dataframe is None and isinstance(self.price_path, Path):
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                feather.write_feather(self.df, self.cache_path, compression='lz4')
+        self._index_prices()
         
         # Load previous state if exists
         if self.state_path and self.state_path.exists():
             try:
-                with open(self.state_path, 'r') as f:
-                    loaded = json.load(f)
-                self.calculation_state.clear()
-                for key, s in loaded.items():
-                    dq = deque(s['values'], maxlen=self.window_size)
-                    self.calculation_state[key] = {
-                        'values': dq,
-                        'sum': s['sum'],
-                        'sum_sq': s['sum_sq'],
-                        'last_timestamp': pd.Timestamp(s['last_timestamp']) if s['last_timestamp'] else None,
-                        'last_stdev': s.get('last_stdev', None)  # Handle backward compatibility
-                    }
+                with open(self.state_path, 'rb') as f:
+                    loaded = pickle.load(f)
+                self._initialize_state()
+                for sec, s in loaded.items():
+                    if s['window'].shape != (self.window_size, len(self.PRICE_TYPES)):
+                        raise ValueError('state was saved with a different window size')
+                    self.calculation_state[sec] = s
             except Exception:
                 self._initialize_state()
         else:
             self._initialize_state()
 
-    def _update_state(self, key, value, ts):
-        st = self.calculation_state
-        ws = self.window_size
-        if key not in st:
-            st[key] = {'values': deque(maxlen=ws), 'sum': 0.0, 'sum_sq': 0.0, 'last_timestamp': None, 'last_stdev': None}
-        state = st[key]
-
-        current_ts = pd.Timestamp(ts)
-        
-        # Check if value is missing (NaN)
-        if pd.isna(value):
-            # Reset state when encountering missing value, but preserve last_stdev
-            state['values'].clear()
-            state['sum'] = 0.0
-            state['sum_sq'] = 0.0
-            state['last_timestamp'] = current_ts
-            # Return the last calculated standard deviation if available
-            return state['last_stdev']
-        
-        state['last_timestamp'] = current_ts
-
-        # Add new value
-        if len(state['values']) == ws:
-            old = state['values'][0]
-            state['sum'] -= old
-            state['sum_sq'] -= old * old
-        state['values'].append(value)
-        state['sum'] += value
-        state['sum_sq'] += value * value
-
-        # Compute stdev if full
-        if len(state['values']) == ws:
-            mean = state['sum'] / ws
-            var = (state['sum_sq'] - state['sum'] * mean) / (ws - 1)
-            stdev = np.sqrt(max(var, 0.0))
-            state['last_stdev'] = stdev  # Store the calculated stdev
-            return stdev
-        return state['last_stdev']  # Return last stdev if window not full yet
+    def _update_security(self, sec, values, last_ts):
+        """
+        Run one security's prices through its saved windows.
+        
+        Args:
+            sec (str): The security identifier
+            values (ndarray): (n, 3) array of bid, mid and ask prices in time order
+            last_ts (int): Timestamp of the last row, in nanoseconds since the epoch
+            
+        Returns:
+            ndarray: (n, 3) array of bid, mid and ask standard deviations
+        """
+        n_cols = len(self.PRICE_TYPES)
+        state = self.calculation_state.get(sec)
+        if state is None:
+            state = {
+                'window': np.full((self.window_size, n_cols), np.nan),
+                'last_timestamp': None,
+                'last_stdev': np.full(n_cols, np.nan)
+            }
+            self.calculation_state[sec] = state
+        
+        stdev, tail = _rolling_std_3col(values, self.window_size, state['window'], state['last_stdev'])
+        
+        # Store what is left in the windows for the next run
+        state['window'] = tail
+        state['last_timestamp'] = last_ts
+        state['last_stdev'] = stdev[-1].copy()
+        self._dirty = True
+        return stdev
+
+    def _cache_is_fresh(self):
+        """
+        Check whether the cached frame can stand in for the parquet file.
+        
+        Returns:
+            bool: True if a cache is configured and is at least as new as the
+            price file; always False when reading from a buffer
+        """
+        return (self.cache_path is not None and isinstance(self.price_path, Path)
+                and self.cache_path.exists()
+                and self.cache_path.stat().st_mtime >= self.price_path.stat().st_mtime)
+
+    def _index_prices(self):
+        """
+        Cache the sorted frame as flat arrays with per-security offsets.
+        
+        Timestamps are kept as int64 nanoseconds and prices as one (N, 3)
+        block, which pandas hands back column-major, so each price type stays
+        contiguous within a security. Rows are sorted by security code, so
+        each code's rows form one segment found with ``np.searchsorted``.
+        """
+        codes = self.df['security_id'].cat.codes.to_numpy()
+        n_codes = len(self.df['security_id'].cat.categories)
+        self._ts = self.df['timestamp'].to_numpy(dtype='datetime64[ns]').view('i8')
+        self._values = self.df[list(self.PRICE_TYPES)].to_numpy(dtype=np.float64)
+        self._offsets = np.searchsorted(codes, np.arange(n_codes + 1))
 
     def process(self, start_time, end_time):
-        start = pd.to_datetime(start_time)
-        end = pd.to_datetime(end_time)
-        lookback = start - pd.Timedelta(days=7)
-
-        df = self.df
-        mask = df['timestamp'] >= lookback
-        results = []
-
-        for sec, grp in df[mask].groupby('security_id', sort=False):
-            grp = grp.sort_values('timestamp')
-            for v_bid, v_mid, v_ask, ts in zip(
-                grp['bid'].values, grp['mid'].values,
-                grp['ask'].values, grp['timestamp'].values
-            ):
-                key_bid = self._get_state_key(sec, 'bid')
-                key_mid = self._get_state_key(sec, 'mid')
-                key_ask = self._get_state_key(sec, 'ask')
-
-                sd_bid = self._update_state(key_bid, v_bid, ts)
-                sd_mid = self._update_state(key_mid, v_mid, ts)
-                sd_ask = self._update_state(key_ask, v_ask, ts)
-
-                if start <= pd.Timestamp(ts) <= end:
-                    results.append({
-                        'security_id': sec,
-                        'timestamp': pd.Timestamp(ts),
-                        'bid_stdev': sd_bid,
-                        'mid_stdev': sd_mid,
-                        'ask_stdev': sd_ask
-                    })
-
-        result_df = pd.DataFrame(results).sort_values(['security_id', 'timestamp'])
-
-        # Save state
-        if self.state_path:
-            to_serial = {}
-            for k, s in self.calculation_state.items():
-                to_serial[k] = {
-                    'values': list(s['values']),
-                    'sum': s['sum'],
-                    'sum_sq': s['sum_sq'],
-                    'last_timestamp': s['last_timestamp'].isoformat() if s['last_timestamp'] else None,
-                    'last_stdev': s['last_stdev']
-                }
+        # Parse the bounds once; everything below compares int64 nanoseconds
+        start_ns = pd.Timestamp(start_time).value
+        end_ns = pd.Timestamp(end_time).value
+        lookback_ns = start_ns - self.LOOKBACK.value
+
+        all_ts = self._ts
+        all_values = self._values
+        labels = self.df['security_id'].cat.categories
+        all_in_range = (all_ts >= start_ns) & (all_ts <= end_ns)
+
+        # Preallocate the output columns, one slot per row in [start, end]
+        n_out = int(all_in_range.sum())
+        out_sec = np.empty(n_out, dtype=object)
+        out_ts = np.empty(n_out, dtype=np.int64)
+        out_bid = np.full(n_out, np.nan)
+        out_mid = np.full(n_out, np.nan)
+        out_ask = np.full(n_out, np.nan)
+        pos = 0
+
+        # Each security's segment is in time order, so its rows from the
+        # lookback onwards are a suffix of the segment
+        groups = []
+        for code in range(len(self._offsets) - 1):
+            lo, hi = self._offsets[code], self._offsets[code + 1]
+            a = lo + np.searchsorted(all_ts[lo:hi], lookback_ns)
+            if a < hi:
+                groups.append((labels[code], a, hi))
+
+        def run(chunk):
+            return [self._update_security(sec, all_values[a:b], int(all_ts[b - 1]))
+                    for sec, a, b in chunk]
+
+        # Securities are independent and each has its own state entry, so
+        # contiguous chunks of them can run on a thread pool; NumPy releases
+        # the GIL inside the kernel's array operations
+        if self.max_workers > 1 and len(groups) > 1:
+            chunk_bounds = np.linspace(0, len(groups), min(self.max_workers, len(groups)) + 1).astype(int)
+            chunks = [groups[a:b] for a, b in zip(chunk_bounds[:-1], chunk_bounds[1:])]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                stdevs = [stdev for part in pool.map(run, chunks) for stdev in part]
+        else:
+            stdevs = run(groups)
+
+        for (sec, a, b), stdev in zip(groups, stdevs):
+            in_range = all_in_range[a:b]
+            k = int(in_range.sum())
+            out_sec[pos:pos + k] = sec
+            out_ts[pos:pos + k] = all_ts[a:b][in_range]
+            out_bid[pos:pos + k] = stdev[in_range, 0]
+            out_mid[pos:pos + k] = stdev[in_range, 1]
+            out_ask[pos:pos + k] = stdev[in_range, 2]
+            pos += k
+
+        # Only the slots filled above are results
+        result_df = pd.DataFrame({
+            'security_id': out_sec[:pos],
+            'timestamp': out_ts[:pos].view('datetime64[ns]'),
+            'bid_stdev': out_bid[:pos],
+            'mid_stdev': out_mid[:pos],
+            'ask_stdev': out_ask[:pos]
+        }).sort_values(['security_id', 'timestamp'])
+
+        # Save state; its arrays pickle as raw buffers, with no per-value conversion
+        if self.state_path and self._dirty:
             self.state_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.state_path, 'w') as f:
-                json.dump(to_serial, f)
+            with open(self.state_path, 'wb') as f:
+                pickle.dump(self.calculation_state, f, protocol=5)
+            self._dirty = False
 
         return result_df
 
     def save(self, result_df, out_path):
+        # Arrow's C++ CSV writer avoids pandas' Python-level row formatting
         Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-        result_df.to_csv(out_path, index=False)
+        pacsv.write_csv(pa.Table.from_pandas(result_df, preserve_index=False), str(out_path))
 
     def _ensure_hourly_snapshots(self):
         """
@@ -192,43 +336,47 @@ class IncrementalStdevCalculator:
         if self.df.empty:
             return
             
-        # Get the full time range
-        min_time = self.df['timestamp'].min()
-        max_time = self.df['timestamp'].max()
-        
-        # Create hourly range
-        hourly_range = pd.date_range(
-            start=min_time.floor('h'),
-            end=max_time.ceil('h'),
-            freq='h'
-        )
-        
-        # Get all unique security IDs
-        security_ids = self.df['security_id'].unique()
-        
-        # Create a complete index with all combinations of security_id and hourly timestamps
-        complete_index = pd.MultiIndex.from_product(
-            [security_ids, hourly_range],
-            names=['security_id', 'timestamp']
-        )
+        # Get the full time range, as whole hours in nanoseconds
+        hour = pd.Timedelta(hours=1).value
+        ts = self.df['timestamp'].to_numpy(dtype='datetime64[ns]').view('i8')
+        first = self.df['timestamp'].min().floor('h').value
+        last = self.df['timestamp'].max().ceil('h').value
+        n_hours = (last - first) // hour + 1
         
-        # Set the current dataframe index for reindexing
-        self.df.set_index(['security_id', 'timestamp'], inplace=True)
+        # Every security that has data gets one slot per hour in a complete
+        # grid, ordered by security and then time
+        sec = self.df['security_id']
+        codes = sec.cat.codes.to_numpy()
+        sec_codes = np.unique(codes)
         
-        # Reindex to include all hourly snapshots, this will add NaN for missing values
-        self.df = self.df.reindex(complete_index).reset_index()
+        # Place each snap in its slot by arithmetic on its offset from the
+        # first hour; snaps that are not on the hour have no slot. Slots
+        # left empty are the missing hours and stay NaN
+        offset = ts - first
+        on_hour = offset % hour == 0
+        slot = np.searchsorted(sec_codes, codes[on_hour]) * n_hours + offset[on_hour] // hour
         
-        # Sort again to ensure proper order
-        self.df.sort_values(['security_id', 'timestamp'], inplace=True)
+        columns = {
+            'security_id': pd.Categorical.from_codes(
+                np.repeat(sec_codes, n_hours), dtype=sec.dtype),
+            'timestamp': np.tile(first + np.arange(n_hours) * hour, len(sec_codes)).view('datetime64[ns]')
+        }
+        for col in self.PRICE_TYPES:
+            filled = np.full(len(sec_codes) * n_hours, np.nan)
+            filled[slot] = self.df[col].to_numpy(dtype=np.float64)[on_hour]
+            columns[col] = filled
+        self.df = pd.DataFrame(columns)
 
 if __name__ == '__main__':
     import time
     base = Path(__file__).resolve().parents[1]
     price_path = base / 'data/stdev_price_data.parq.gzip'
     out_path = base / 'results/stdev_a.csv'
-    state_path = base / 'results/calculation_state.json'
+    state_path = base / 'results/calculation_state.pkl'
+    cache_path = base / 'data/stdev_price_data_a.cache.feather'
 
-    calc = IncrementalStdevCalculator(price_path, window_size=20, state_path=state_path)
+    calc = IncrementalStdevCalculator(price_path, window_size=20, state_path=state_path,
+                                      cache_path=cache_path)
     calc.load_data()
     t0 = time.perf_counter()
     df_res = calc.process('2021-11-20 00:00:00', '2021-11-23 09:00:00')
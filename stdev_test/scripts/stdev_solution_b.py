@@ -1,24 +1,91 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.feather as feather
 from pathlib import Path
 
 class RollingStdevCalculator:
-    def __init__(self, price_path):
+    # How far back a snap may reuse the last completed stdev
+    LOOKBACK = pd.Timedelta(days=7)
+    # Spacing of contiguous snaps, in nanoseconds
+    HOUR_NS = pd.Timedelta(hours=1).value
+    # The only parquet columns the calculation reads
+    COLUMNS = ['snap_time', 'security_id', 'bid', 'mid', 'ask']
+
+    def __init__(self, price_path, window_size=20, cache_path=None):
         """
         Initialize with path to the gzip-compressed parquet file containing columns:
-        ['timestamp', 'security_id', 'bid', 'mid', 'ask'].
+        ['timestamp', 'security_id', 'bid', 'mid', 'ask']. An open binary buffer
+        holding the parquet data may be given instead of a path.
+
+        window_size is the number of contiguous hourly snaps in each stdev window.
+        cache_path, if given, is a Feather file that keeps the loaded, sorted frame
+        between runs.
         """
-        self.price_path = Path(price_path)
+        self.price_path = price_path if hasattr(price_path, 'read') else Path(price_path)
+        self.window_size = window_size
+        self.cache_path = Path(cache_path) if cache_path else None
         self.df = None
+        self._ts = None
+
+    def _read_prices(self, dataframe=None):
+        """
+        Read the used columns of the price file, with security_id as a categorical.
+        A file with a .feather suffix is read as Arrow IPC, anything else (including
+        a buffer) as parquet.
+        A dataframe, if given, is used in place of the file.
+        """
+        if dataframe is not None:
+            df = dataframe[self.COLUMNS].reset_index(drop=True)
+            df['security_id'] = df['security_id'].astype('category')
+            return df
+        if isinstance(self.price_path, Path) and self.price_path.suffix == '.feather':
+            df = feather.read_feather(self.price_path, columns=self.COLUMNS)
+            df['security_id'] = df['security_id'].astype('category')
+            return df
+        return pd.read_parquet(self.price_path, columns=self.COLUMNS,
+                               read_dictionary=['security_id'])
+
+    def _cache_is_fresh(self):
+        """
+        Return True if a cache file is configured and at least as new as the
+        price file. Always False when the prices come from a buffer.
+        """
+        return (self.cache_path is not None and isinstance(self.price_path, Path)
+                and self.cache_path.exists()
+                and self.cache_path.stat().st_mtime >= self.price_path.stat().st_mtime)
 
-    def load_data(self):
+    def load_data(self, dataframe=None):
         """
-        Load the parquet file into a DataFrame, parse timestamps, and sort.
+        Load the price file into a DataFrame, parse timestamps, and sort.
+        If the cache file is at least as new as the parquet file, load the
+        already sorted frame from it instead.
+
+        dataframe, if given, holds prices with the price file's columns and is
+        used instead of reading the file; the cache is then bypassed.
         """
-        # Read parquet
-        self.df = pd.read_parquet(self.price_path)
-        # Ensure timestamp is datetime and sort by timestamp ascending
-        self.df['timestamp'] = pd.to_datetime(self.df['snap_time'])
-        self.df.sort_values('timestamp', inplace=True)
+        if dataframe is None and self._cache_is_fresh():
+            self.df = feather.read_feather(self.cache_path)
+        else:
+            # Read only the columns used below
+            self.df = self._read_prices(dataframe)
+            # Ensure timestamp is datetime and sort each security's snaps by time,
+            # keeping every security's rows contiguous
+            self.df['timestamp'] = pd.to_datetime(self.df['snap_time'])
+            # _read_prices returns security_id as a categorical, so sorting, block
+            # detection and the stdev match work on integer codes; sorted
+            # categories keep code order the same as label order
+            sec = self.df['security_id']
+            self.df['security_id'] = sec.cat.reorder_categories(sec.cat.categories.sort_values())
+            self.df.sort_values(['security_id', 'timestamp'], inplace=True)
+            # Unique row labels let grouped results align back onto the frame
+            self.df.reset_index(drop=True, inplace=True)
+            if self.cache_path and dataframe is None and isinstance(self.price_path, Path):
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                feather.write_feather(self.df, self.cache_path, compression='lz4')
+        # Cache timestamps as int64 nanoseconds for masking and gap checks
+        self._ts = self.df['timestamp'].to_numpy(dtype='datetime64[ns]').view('i8')
 
     def process(self, start_time, end_time):
         """
@@ -26,70 +93,77 @@ class RollingStdevCalculator:
         for every snap between start_time and end_time (inclusive).
 
         For each snap timestamp t, we look back 7 days and find the most recent contiguous
-        hourly block of at least 20 snaps for that security. We compute std over the last 20
-        within that block, even if they do not end exactly at t.
+        hourly block of at least window_size snaps for that security. We compute std over the
+        last window_size within that block, even if they do not end exactly at t.
 
         Returns a DataFrame with columns ['timestamp', 'security_id', 'stdev_bid', 'stdev_mid', 'stdev_ask']
         and one row per original snap within [start_time, end_time].
         """
-        df = self.df.copy()
         # Define time boundaries
         start = pd.to_datetime(start_time)
         end = pd.to_datetime(end_time)
 
-        # Identify breaks in hourly snaps within each security
-        df['gap'] = (df.groupby('security_id')['timestamp']
-                       .diff().ne(pd.Timedelta(hours=1))).astype(int)
-        # Block id increases whenever there's a gap or at group start
-        df['block'] = df.groupby('security_id')['gap'].cumsum()
-
-        # Compute rolling std within each block for each price type
-        df['stdev_bid'] = (
-            df.groupby(['security_id', 'block'])['bid']
-              .transform(lambda x: x.rolling(window=20, min_periods=20).std())
-        )
-        df['stdev_mid'] = (
-            df.groupby(['security_id', 'block'])['mid']
-              .transform(lambda x: x.rolling(window=20, min_periods=20).std())
-        )
-        df['stdev_ask'] = (
-            df.groupby(['security_id', 'block'])['ask']
-              .transform(lambda x: x.rolling(window=20, min_periods=20).std())
-        )
-
-        # Prepare a DataFrame of valid stdev values (timestamp when the rolling window completes)
-        stdev_df = (
-            df.dropna(subset=['stdev_bid', 'stdev_mid', 'stdev_ask'])
-              [['security_id', 'timestamp', 'stdev_bid', 'stdev_mid', 'stdev_ask']]
-              .drop_duplicates()
-              .sort_values('timestamp')
+        # Only rows that can feed a window completing within LOOKBACK of start
+        # matter: that is LOOKBACK plus one window's span before start
+        first_needed = start - self.LOOKBACK - pd.Timedelta(hours=self.window_size - 1)
+        mask = (self._ts >= first_needed.value) & (self._ts <= end.value)
+        df = self.df.loc[mask, ['security_id', 'timestamp', 'bid', 'mid', 'ask']]
+
+        # Identify breaks in hourly snaps: a new block starts at every gap and
+        # wherever the security changes (rows are sorted by security, then time)
+        ts = self._ts[mask]
+        security = df['security_id'].cat.codes.to_numpy()
+        new_block = np.ones(len(df), dtype=bool)
+        new_block[1:] = (np.diff(ts) != self.HOUR_NS) | (security[1:] != security[:-1])
+
+        # Carry the position of each block's first row forward in one pass,
+        # so every row is labelled with the contiguous block it belongs to
+        positions = np.arange(len(df))
+        block = np.maximum.accumulate(np.where(new_block, positions, 0))
+
+        # Compute rolling std within each block for all three price types in one pass.
+        # Block ids increase with row position, so the groups come back in row order
+        stdev = (
+            df[['bid', 'mid', 'ask']].groupby(block)
+              .rolling(window=self.window_size, min_periods=self.window_size)
+              .std()
+              .to_numpy()
         )
 
-        # Filter original snaps to the requested window
-        window_df = (
-            df[(df['timestamp'] >= start) & (df['timestamp'] <= end)]
-              [['security_id', 'timestamp']]
-              .sort_values('timestamp')
+        # Carry forward the position of the latest row with a complete stdev
+        # (where its rolling window completes), so each snap finds the most
+        # recent one at or before it in a single pass
+        complete = ~np.isnan(stdev).any(axis=1)
+        latest = np.maximum.accumulate(np.where(complete, positions, -1))
+
+        # For each snap in the requested window, use that stdev if it belongs
+        # to the same security and completed within LOOKBACK before the snap
+        rows = np.flatnonzero((ts >= start.value) & (ts <= end.value))
+        src = latest[rows]
+        found = src >= 0
+        found[found] = (
+            (security[src[found]] == security[rows[found]])
+            & (ts[rows[found]] - ts[src[found]] <= self.LOOKBACK.value)
         )
-
-        # For each snap, merge the most recent stdev within 7 days before the snap
-        result = pd.merge_asof(
-            window_df,
-            stdev_df,
-            by='security_id',
-            on='timestamp',
-            direction='backward',
-            tolerance=pd.Timedelta(days=7)
-        )
-
-        return result.sort_values(['security_id', 'timestamp'])
+        matched = np.full((len(rows), 3), np.nan)
+        matched[found] = stdev[src[found]]
+
+        # Rows are already sorted by security, then time
+        return pd.DataFrame({
+            'security_id': df['security_id'].iloc[rows].to_numpy(),
+            'timestamp': df['timestamp'].iloc[rows].to_numpy(),
+            'stdev_bid': matched[:, 0],
+            'stdev_mid': matched[:, 1],
+            'stdev_ask': matched[:, 2]
+        })
 
     def save(self, result_df, out_path):
         """
-        Save the result DataFrame to CSV at out_path.
+        Save the result DataFrame to CSV at out_path, using Arrow's C++ CSV
+        writer rather than pandas' Python-level row formatting.
         """
         out_path = Path(out_path)
-        result_df.to_csv(out_path, index=False)
+        pacsv.write_csv(pa.Table.from_pandas(result_df, preserve_index=False), str(out_path))
 
 
 if __name__ == '__main__':
@@ -98,8 +172,9 @@ if __name__ == '__main__':
     base = Path(__file__).resolve().parents[1]
     price = base / 'data/stdev_price_data.parq.gzip'
     out = base / 'results/stdev_b.csv'
+    cache = base / 'data/stdev_price_data_b.cache.feather'
 
-    calc = RollingStdevCalculator(price)
+    calc = RollingStdevCalculator(price, cache_path=cache)
     calc.load_data()
 
     start = time.perf_counter()
@@ -0,0 +1,92 @@
+"""Synthetic price data and the test case base shared by the stdev tests."""
+import contextlib
+import functools
+import gc
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+@contextlib.contextmanager
+def gc_disabled():
+    """Pause the cyclic garbage collector while building fixtures."""
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+@functools.lru_cache(maxsize=None)
+def make_test_frame(seed=0xC0FFEE):
+    """
+    Build the synthetic prices shared by the stdev tests.
+    
+    Seeded, so every run sees the same data, and cached, so it is built
+    once per seed; callers must not modify the returned frame.
+    """
+    rng = np.random.default_rng(seed)
+    
+    # Create test data with 30 hourly snapshots for 2 securities
+    dates = pd.date_range('2021-11-20', periods=30, freq='h')
+    bid1 = np.linspace(100, 110, 30) + rng.normal(0, 0.5, 30)
+    mid1 = np.linspace(101, 111, 30) + rng.normal(0, 0.5, 30)
+    ask1 = np.linspace(102, 112, 30) + rng.normal(0, 0.5, 30)
+
+    # Add a gap for testing gap handling (skip 5 hours)
+    dates2 = pd.date_range('2021-11-20', periods=15, freq='h').union(
+        pd.date_range('2021-11-20 20:00:00', periods=15, freq='h')
+    )
+    bid2 = np.linspace(200, 220, 30) + rng.normal(0, 1, 30)
+    mid2 = np.linspace(202, 222, 30) + rng.normal(0, 1, 30)
+    ask2 = np.linspace(204, 224, 30) + rng.normal(0, 1, 30)
+
+    # Build both securities in one frame rather than concatenating two
+    return pd.DataFrame({
+        'security_id': np.repeat(['SEC1', 'SEC2'], 30),
+        'snap_time': np.concatenate([dates.values, dates2.values]),
+        'bid': np.concatenate([bid1, bid2]),
+        'mid': np.concatenate([mid1, mid2]),
+        'ask': np.concatenate([ask1, ask2])
+    })
+
+
+def write_fixture_feather(df, path):
+    """Write a test frame to an uncompressed Feather file at path."""
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False),
+                          path, compression='uncompressed')
+
+
+class StdevTestCase(unittest.TestCase):
+    """Base for the stdev tests: shared input data, parameters and directory."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up test data shared by every test in the class"""
+        # One temporary directory holds the input data and every test's outputs
+        cls.data_dir = tempfile.TemporaryDirectory()
+        cls.temp_dir = Path(cls.data_dir.name)
+        
+        # Build and save test data once; the calculators only read it. The
+        # collector is paused as the build only makes short-lived objects
+        cls.input_path = cls.temp_dir / 'test_input.feather'
+        with gc_disabled():
+            cls.test_data = make_test_frame()
+            write_fixture_feather(cls.test_data, cls.input_path)
+        
+        # Set window parameters
+        cls.window_size = 10
+        
+        # Set date range for testing
+        cls.start_date = '2021-11-20 08:00:00'  # After window size
+        cls.end_date = '2021-11-22 08:00:00'
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up test data and outputs"""
+        cls.data_dir.cleanup()
@@ -1,102 +1,113 @@
+import io
 import unittest
 import pandas as pd
-import numpy as np
 import os
 import sys
-import tempfile
-from datetime import datetime, timedelta
 from pathlib import Path
 
 # Add the parent directory to sys.path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-# Import the solution
+# Import the solutions
+from scripts.stdev_solution_a import IncrementalStdevCalculator
 from scripts.stdev_solution_b import RollingStdevCalculator
+from tests._fixtures import StdevTestCase
 
-class TestStdevSolutions(unittest.TestCase):
-    
-    def setUp(self):
-        """Set up test data"""
-        # Create a temporary directory for test data
-        self.test_dir = tempfile.TemporaryDirectory()
-        self.temp_dir = Path(self.test_dir.name)
-        
-        # Create test data with 30 hourly snapshots for 2 securities
-        dates = pd.date_range('2021-11-20', periods=30, freq='h')
-        security1 = pd.DataFrame({
-            'security_id': 'SEC1',
-            'snap_time': dates,
-            'bid': np.linspace(100, 110, 30) + np.random.normal(0, 0.5, 30),
-            'mid': np.linspace(101, 111, 30) + np.random.normal(0, 0.5, 30),
-            'ask': np.linspace(102, 112, 30) + np.random.normal(0, 0.5, 30)
-        })
-        
-        # Add a gap for testing gap handling (skip 5 hours)
-        dates2 = pd.date_range('2021-11-20', periods=15, freq='h').union(
-            pd.date_range('2021-11-20 20:00:00', periods=15, freq='h')
-        )
-        security2 = pd.DataFrame({
-            'security_id': 'SEC2',
-            'snap_time': dates2,
-            'bid': np.linspace(200, 220, 30) + np.random.normal(0, 1, 30),
-            'mid': np.linspace(202, 222, 30) + np.random.normal(0, 1, 30),
-            'ask': np.linspace(204, 224, 30) + np.random.normal(0, 1, 30)
-        })
-        
-        # Combine data
-        self.test_data = pd.concat([security1, security2])
-        
-        # Set window parameters
-        self.window_size = 10
-        
-        # Define paths
-        self.input_path = self.temp_dir / 'test_input.parq.gzip'
-        self.output_path = self.temp_dir / 'test_output.csv'
-        
-        # Save test data
-        self.test_data.to_parquet(self.input_path, compression='gzip')
-        
-        # Set date range for testing
-        self.start_date = '2021-11-20 08:00:00'  # After window size
-        self.end_date = '2021-11-22 08:00:00'
-
-    def tearDown(self):
-        """Clean up test data"""
-        self.test_dir.cleanup()
+
+class TestStdevSolutions(StdevTestCase):
+
+    # Each calculator with the names of its stdev output columns
+    CALCULATORS = [
+        (RollingStdevCalculator, ['stdev_bid', 'stdev_mid', 'stdev_ask']),
+        (IncrementalStdevCalculator, ['bid_stdev', 'mid_stdev', 'ask_stdev'])
+    ]
 
     def test_solution(self):
         """Test standard deviation calculation"""
-        # Initialize calculator
-        calculator = RollingStdevCalculator(str(self.input_path))
-        calculator.load_data()
-        
-        # Run calculation
-        results = calculator.process(
-            start_time=self.start_date, 
-            end_time=self.end_date
-        )
-        
-        # Save results
-        calculator.save(results, str(self.output_path))
-        
-        # Check if output file exists
-        self.assertTrue(os.path.exists(self.output_path))
-        
-        # Load results
-        results_df = pd.read_csv(self.output_path)
-        
-        # Basic validation
-        self.assertGreater(len(results_df), 0, "Results should not be empty")
-        self.assertTrue(all(col in results_df.columns for col in ['security_id', 'timestamp', 'stdev_bid', 'stdev_mid', 'stdev_ask']), 
-                       "Output should contain all required columns")
-        
-        # Check if results only contain timestamps within specified date range
-        results_df['timestamp'] = pd.to_datetime(results_df['timestamp'])
-        self.assertTrue(
-            (results_df['timestamp'] >= pd.to_datetime(self.start_date)).all() and 
-            (results_df['timestamp'] <= pd.to_datetime(self.end_date)).all(),
-            "Results should only contain timestamps within the specified date range"
-        )
+        start_ts = pd.Timestamp(self.start_date)
+        end_ts = pd.Timestamp(self.end_date)
+        for calculator_cls, stdev_cols in self.CALCULATORS:
+            with self.subTest(calculator=calculator_cls.__name__):
+                output_path = self.temp_dir / f'{self._testMethodName}_{calculator_cls.__name__}.csv'
+                
+                # Initialize calculator
+                calculator = calculator_cls(str(self.input_path))
+                calculator.load_data(dataframe=self.test_data)
+                
+                # Run calculation
+                results = calculator.process(
+                    start_time=self.start_date, 
+                    end_time=self.end_date
+                )
+                
+                # Save results
+                calculator.save(results, str(output_path))
+                
+                # Check if output file exists
+                self.assertTrue(os.path.exists(output_path))
+                
+                # Load results
+                results_df = pd.read_csv(output_path, parse_dates=['timestamp'])
+                
+                # Basic validation
+                self.assertGreater(len(results_df), 0, "Results should not be empty")
+                self.assertTrue(all(col in results_df.columns for col in ['security_id', 'timestamp'] + stdev_cols), 
+                               "Output should contain all required columns")
+                
+                # Check if results only contain timestamps within specified date range
+                self.assertTrue(
+                    results_df['timestamp'].between(start_ts, end_ts).all(),
+                    "Results should only contain timestamps within the specified date range"
+                )
+
+    def test_parquet_input(self):
+        """Test that a parquet price file gives the same results as Feather"""
+        # The parquet copy never needs to touch disk
+        parquet_buf = io.BytesIO()
+        self.test_data.to_parquet(parquet_buf, engine='pyarrow', compression=None)
+        parquet_buf.seek(0)
+
+        results = []
+        for source in (str(self.input_path), parquet_buf):
+            calculator = RollingStdevCalculator(source, window_size=self.window_size)
+            calculator.load_data()
+            results.append(calculator.process(
+                start_time=self.start_date,
+                end_time=self.end_date
+            ))
+
+        pd.testing.assert_frame_equal(results[0], results[1])
+
+    def test_cached_frame(self):
+        """Test that a fresh cache is read as is and a stale one is rebuilt"""
+        for calculator_cls, _ in self.CALCULATORS:
+            with self.subTest(calculator=calculator_cls.__name__):
+                cache_path = (self.temp_dir
+                              / f'{self._testMethodName}_{calculator_cls.__name__}.feather')
+
+                def run():
+                    calculator = calculator_cls(str(self.input_path), window_size=self.window_size,
+                                                cache_path=str(cache_path))
+                    calculator.load_data()
+                    return calculator.process(start_time=self.start_date, end_time=self.end_date)
+
+                # The first run builds the cache
+                expected = run()
+                self.assertTrue(os.path.exists(cache_path))
+                written = cache_path.stat().st_mtime_ns
+
+                # A cache newer than the price file is read, not rewritten
+                pd.testing.assert_frame_equal(run(), expected)
+                self.assertEqual(cache_path.stat().st_mtime_ns, written,
+                                 "A fresh cache should not be rebuilt")
+
+                # A cache older than the price file is rebuilt
+                stale = self.input_path.stat().st_mtime_ns - 60 * 10**9
+                os.utime(cache_path, ns=(stale, stale))
+                pd.testing.assert_frame_equal(run(), expected)
+                self.assertGreater(cache_path.stat().st_mtime_ns, stale,
+                                   "A stale cache should be rebuilt")
+
 
 if __name__ == '__main__':
     unittest.main()